@@ -0,0 +1,630 @@
+#!/usr/bin/python
+# -*- coding: ascii -*-
+"""Streaming parser for Nagios objects.cache and status.dat files.
+
+Shared by nagiosstatd, nagios_to_cacti, downtime and ack, so the block
+format only has to be understood in one place."""
+
+import os
+import mmap
+import multiprocessing
+
+# Read the file in large buffered chunks, never as one big list of lines.
+READ_BUFFER = 4 * 1024 * 1024
+
+# Fields which are always numeric.  Stored as floats, which is what the
+# tools have always handed out over the wire.
+NUMERIC_FIELDS = set([
+    # info / programstatus
+    'created', 'last_update_check', 'update_available', 'nagios_pid',
+    'daemon_mode', 'program_start', 'last_command_check', 'last_log_rotation',
+    'enable_notifications', 'active_service_checks_enabled',
+    'passive_service_checks_enabled', 'active_host_checks_enabled',
+    'passive_host_checks_enabled', 'enable_event_handlers',
+    'obsess_over_services', 'obsess_over_hosts', 'check_service_freshness',
+    'check_host_freshness', 'enable_flap_detection',
+    'enable_failure_prediction', 'modified_host_attributes',
+    'modified_service_attributes', 'next_comment_id', 'next_downtime_id',
+    'next_event_id', 'next_problem_id', 'next_notification_id',
+    'total_external_command_buffer_slots',
+    'used_external_command_buffer_slots',
+    'high_external_command_buffer_slots',
+    # hoststatus / servicestatus
+    'modified_attributes', 'check_interval', 'retry_interval',
+    'has_been_checked', 'should_be_scheduled', 'check_execution_time',
+    'check_latency', 'check_type', 'current_state', 'last_hard_state',
+    'last_event_id', 'current_event_id', 'current_problem_id',
+    'last_problem_id', 'current_attempt', 'max_attempts', 'state_type',
+    'last_state_change', 'last_hard_state_change', 'last_time_up',
+    'last_time_down', 'last_time_unreachable', 'last_time_ok',
+    'last_time_warning', 'last_time_unknown', 'last_time_critical',
+    'last_check', 'next_check', 'check_options',
+    'current_notification_number', 'current_notification_id',
+    'last_notification', 'next_notification', 'no_more_notifications',
+    'notifications_enabled', 'active_checks_enabled',
+    'passive_checks_enabled', 'event_handler_enabled',
+    'problem_has_been_acknowledged', 'acknowledgement_type',
+    'flap_detection_enabled', 'failure_prediction_enabled',
+    'process_performance_data', 'obsess_over_host', 'obsess_over_service',
+    'last_update', 'is_flapping', 'percent_state_change',
+    'scheduled_downtime_depth',
+    # contactstatus
+    'last_host_notification', 'last_service_notification',
+    'host_notifications_enabled', 'service_notifications_enabled',
+    # comments and downtime
+    'entry_type', 'comment_id', 'source', 'persistent', 'entry_time',
+    'expires', 'expire_time', 'downtime_id', 'start_time', 'end_time',
+    'triggered_by', 'fixed', 'duration',
+    # objects.cache
+    'max_check_attempts', 'notification_interval',
+    'first_notification_delay', 'low_flap_threshold', 'high_flap_threshold',
+    'freshness_threshold', 'check_freshness', 'first_notification',
+    'is_volatile', 'parallelize_check', 'retain_status_information',
+    'retain_nonstatus_information', 'can_submit_commands'])
+
+# Fields which are always strings, even when they happen to look numeric.
+STRING_FIELDS = set([
+    'host_name', 'service_description', 'plugin_output',
+    'long_plugin_output', 'performance_data', 'check_command',
+    'event_handler', 'check_period', 'notification_period',
+    'host_notification_period', 'service_notification_period',
+    'host_notification_commands', 'service_notification_commands',
+    'host_notification_options', 'service_notification_options',
+    'comment_data', 'author', 'hostgroup_name', 'servicegroup_name',
+    'contact_name', 'contactgroup_name', 'command_name', 'command_line',
+    'timeperiod_name', 'alias', 'display_name', 'address', 'members',
+    'contacts', 'contact_groups', 'hostgroups', 'servicegroups', 'parents',
+    'notes', 'notes_url', 'action_url', 'icon_image', 'icon_image_alt',
+    'notification_options', 'flap_detection_options', 'stalking_options',
+    'escalation_options', 'escalation_period', 'email', 'pager', 'version',
+    'last_version', 'new_version', 'global_host_event_handler',
+    'global_service_event_handler', 'name', 'use'])
+
+NUMERIC = 1
+STRING = 2
+
+# Per-field type table.  Fields not listed here fall back to guess_value().
+FIELD_TYPES = {}
+for field in NUMERIC_FIELDS:
+    FIELD_TYPES[field] = NUMERIC
+for field in STRING_FIELDS:
+    FIELD_TYPES[field] = STRING
+del field
+
+_numeric_start = set('-+.0123456789')
+
+def to_float(value):
+    """Convert a value from a numeric field, keeping it as-is if it's junk."""
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+def guess_value(value):
+    """Convert a value from a field missing from FIELD_TYPES, such as custom
+    object variables.  Only values that look numeric try float()."""
+    if value and value[0] in _numeric_start:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    return value
+
+def block_tag(line):
+    """Return the block type from a 'define host {' or 'hoststatus {' line,
+    with any trailing 'status' removed."""
+    words = line[:-1].split()
+    if words[0] == 'define':
+        tag = words[1]
+    else:
+        tag = words[0]
+    if tag.endswith('status'):
+        tag = tag[:-6]
+    return tag
+
+def iter_blocks(file, sep='=', types=FIELD_TYPES):
+    """Yield (tag, block) for each block in a status.dat (sep='=') or
+    objects.cache (sep='\\t') file, one block at a time."""
+    handle = open(file, 'rb', READ_BUFFER)
+    try:
+        for tag, block in parse_lines(handle, sep, types):
+            yield tag, block
+    finally:
+        handle.close()
+
+def parse_lines(lines, sep='=', types=FIELD_TYPES, pairs=False):
+    """Yield (tag, block) for each block in an iterable of lines.  With
+    pairs, each block is a list of (field, value) in file order instead of
+    a dict."""
+    strip = sep.isspace()
+    tag = None
+    block = None
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if block is None:
+            if line.endswith('{') and not line.startswith('#'):
+                tag = block_tag(line)
+                block = {}
+                if pairs:
+                    block = []
+            continue
+        if line == '}':
+            yield tag, block
+            block = None
+            continue
+        entry, _sep, value = line.partition(sep)
+        kind = types.get(entry)
+        if kind is NUMERIC:
+            value = to_float(value)
+        elif kind is None:
+            value = guess_value(value)
+        if strip and value.__class__ is str:
+            value = value.strip()
+        if pairs:
+            block.append((entry, value))
+        else:
+            block[entry] = value
+
+# files smaller than this aren't worth handing to a process pool
+PARALLEL_MIN_SIZE = 4 * 1024 * 1024
+# chunks per process, so one slow chunk doesn't hold up the rest
+CHUNKS_PER_PROCESS = 4
+
+def split_chunks(file, chunks):
+    """Split file into about chunks (start, end) byte ranges, each ending
+    just after a block's closing '}' line, so every block falls inside one
+    range."""
+    handle = open(file, 'rb')
+    try:
+        data = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+        handle.close()
+    try:
+        size = data.size()
+        ranges = []
+        start = 0
+        for x in range(1, chunks):
+            pos = max(start, size * x / chunks)
+            while True:
+                pos = data.find('}', pos)
+                if pos < 0:
+                    break
+                line_start = data.rfind('\n', 0, pos) + 1
+                line_end = data.find('\n', pos)
+                if line_end < 0:
+                    line_end = size
+                if data[line_start:line_end].strip() == '}':
+                    break
+                pos = line_end
+            if pos < 0:
+                break
+            end = line_end + 1
+            if end > start:
+                ranges.append((start, end))
+                start = end
+        if start < size:
+            ranges.append((start, size))
+        return ranges
+    finally:
+        data.close()
+
+def parse_chunk(args):
+    """Process pool worker: the (tag, pairs) list of one byte range.  Blocks
+    go back as field lists so the dicts are rebuilt in file order, and
+    iterate exactly like ones from iter_blocks()."""
+    file, start, end, sep = args
+    handle = open(file, 'rb')
+    try:
+        handle.seek(start)
+        data = handle.read(end - start)
+    finally:
+        handle.close()
+    # only '\n' ends a line, as when iter_blocks() reads the file;
+    # splitlines() would also split plugin output at '\r'
+    return list(parse_lines(data.split('\n'), sep, pairs=True))
+
+def iter_blocks_parallel(file, sep='=', processes=None):
+    """iter_blocks() with the parsing spread over a pool of processes.  The
+    file is split at block boundaries and the blocks come back in file
+    order, the same as from iter_blocks().  Small files, or processes=1,
+    are parsed serially."""
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if processes <= 1 or os.path.getsize(file) < PARALLEL_MIN_SIZE:
+        for tag, block in iter_blocks(file, sep):
+            yield tag, block
+        return
+    ranges = split_chunks(file, processes * CHUNKS_PER_PROCESS)
+    pool = multiprocessing.Pool(processes)
+    try:
+        for blocks in pool.imap(parse_chunk,
+                [(file, start, end, sep) for start, end in ranges]):
+            for tag, block in blocks:
+                yield tag, dict(block)
+    finally:
+        pool.terminate()
+
+class Schema(object):
+    """The field names of a compact block, shared by every Record laid out
+    the same way.  Get them from schema(), never directly."""
+    __slots__ = ('fields', 'index')
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.index = dict([(field, x) for x, field in enumerate(fields)])
+
+_schemas = {}
+
+def schema(fields):
+    """The shared Schema for a tuple of field names."""
+    try:
+        return _schemas[fields]
+    except KeyError:
+        return _schemas.setdefault(fields, Schema(fields))
+
+class Record(object):
+    """
+    Read-mostly stand-in for a block dict: a shared Schema plus a list of
+    values, instead of a hash table per block.  Supports what the tools do
+    with blocks - get(), [], in, has_key(), keys()/items() and ==.
+    """
+    __slots__ = ('_schema', '_values')
+    __hash__ = None
+
+    def __init__(self, schema, values):
+        self._schema = schema
+        self._values = values
+
+    def __getitem__(self, field):
+        return self._values[self._schema.index[field]]
+
+    def get(self, field, default=None):
+        x = self._schema.index.get(field)
+        if x is None:
+            return default
+        return self._values[x]
+
+    def __setitem__(self, field, value):
+        x = self._schema.index.get(field)
+        if x is None:
+            self._schema = schema(self._schema.fields + (field,))
+            self._values.append(value)
+        else:
+            self._values[x] = value
+
+    def __contains__(self, field):
+        return field in self._schema.index
+
+    has_key = __contains__
+
+    def __len__(self):
+        return len(self._values)
+
+    def __iter__(self):
+        return iter(self._schema.fields)
+
+    def keys(self):
+        return list(self._schema.fields)
+
+    def values(self):
+        return list(self._values)
+
+    def items(self):
+        return zip(self._schema.fields, self._values)
+
+    iterkeys = __iter__
+
+    def itervalues(self):
+        return iter(self._values)
+
+    def iteritems(self):
+        return iter(self.items())
+
+    def copy(self):
+        """A plain dict of the fields."""
+        return dict(self.items())
+
+    def __eq__(self, other):
+        if other.__class__ is Record and other._schema is self._schema:
+            return self._values == other._values
+        try:
+            return self.copy() == dict(other.items())
+        except AttributeError:
+            return False
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'Record(%r)' % (self.copy())
+
+    def __reduce__(self):
+        # so unpickled records share schemas again
+        return (make_record, (self._schema.fields, self._values))
+
+def make_record(fields, values):
+    """A Record from a tuple of field names and a list of values."""
+    return Record(schema(fields), values)
+
+# whole numbers up to this are shared float objects in compact blocks
+SHARED_FLOAT_MAX = 65536
+# strings up to this long are interned in compact blocks
+INTERN_MAX = 64
+_floats = {}
+
+def compact_value(value):
+    """Share common values: interned short strings, and one float object
+    for each small whole number, which covers flags and state codes."""
+    if value.__class__ is float:
+        if 0 <= value <= SHARED_FLOAT_MAX and value == int(value):
+            return _floats.setdefault(value, value)
+    elif value.__class__ is str and len(value) <= INTERN_MAX:
+        return intern(value)
+    return value
+
+def compact_block(block):
+    """The Record for a block dict."""
+    return Record(schema(tuple(block.iterkeys())),
+            [compact_value(value) for value in block.itervalues()])
+
+def is_block(value):
+    """True for a block, compact or not, as opposed to a level of the tree."""
+    return value.__class__ is dict or value.__class__ is Record
+
+def add_object(object, tag, block, compact=False):
+    """File an objects.cache block into the object tree, as a Record if
+    compact.  Returns the name it was filed under, or None if the block has
+    no usable name."""
+    if tag not in object:
+        object[tag] = {}
+    tree = object[tag]
+    # base catchall - hosts, hostgroups, contacts, contactgroups
+    if '%s_name' % (tag) in block:
+        name = block.pop('%s_name' % (tag))
+    # host escalations
+    elif 'host_name' in block and 'service_description' not in block:
+        name = block.pop('host_name')
+    # services and service escalations
+    elif 'service_description' in block:
+        host_name = block.pop('host_name', None)
+        name = block.pop('service_description')
+        if compact:
+            host_name = compact_value(host_name)
+        if host_name not in tree:
+            tree[host_name] = {}
+        tree = tree[host_name]
+    else:
+        return None
+    if compact:
+        block = compact_block(block)
+        name = compact_value(name)
+    tree[name] = block
+    return name
+
+def status_key(tag, block):
+    """Pop and return the key a status.dat block is filed under: a
+    (host_name, service_description) tuple for service blocks, the
+    '<type>_name' for named blocks, or None for singletons like 'info'."""
+    if tag.startswith('service'):
+        return (block.pop('host_name', None), block.pop('service_description', None))
+    for suffix in ('downtime', 'comment'):
+        if tag.endswith(suffix):
+            shorttag = tag[:-len(suffix)]
+            break
+    else:
+        shorttag = tag
+    if '%s_name' % (shorttag) in block:
+        return block.pop('%s_name' % (shorttag))
+    return None
+
+def add_status(status, tag, key, block, compact=False):
+    """File a status.dat block into the status tree under its status_key(),
+    as a Record if compact."""
+    if compact:
+        block = compact_block(block)
+        if key.__class__ is tuple:
+            key = tuple([compact_value(name) for name in key])
+        elif key is not None:
+            key = compact_value(key)
+    if key is None:
+        status[tag] = block
+        return
+    if tag not in status:
+        status[tag] = {}
+    if key.__class__ is tuple:
+        host_name, service_description = key
+        if host_name not in status[tag]:
+            status[tag][host_name] = {}
+        status[tag][host_name][service_description] = block
+    else:
+        status[tag][key] = block
+
+def load_object(file, compact=False, processes=1):
+    """Read objects.cache into a {tag: {name: block}} tree, with Record
+    blocks if compact, parsed by that many processes."""
+    object = {}
+    for tag, block in iter_blocks_parallel(file, '\t', processes):
+        add_object(object, tag, block, compact)
+    return object
+
+def load_status(file, compact=False, processes=1):
+    """Read status.dat into a {tag: {name: block}} tree, with Record blocks
+    if compact, parsed by that many processes."""
+    status = {}
+    for tag, block in iter_blocks_parallel(file, '=', processes):
+        key = status_key(tag, block)
+        if key.__class__ is tuple and key[1] is None:
+            # service block without a service_description
+            continue
+        add_status(status, tag, key, block, compact)
+    return status
+
+def get_status(status, tag, key):
+    """Return the block filed under key by add_status(), or None."""
+    try:
+        if key.__class__ is tuple:
+            return status[tag][key[0]][key[1]]
+        return status[tag][key]
+    except (KeyError, TypeError):
+        return None
+
+def status_entries(status, tag):
+    """Yield (key, block) for every keyed block of tag in a status tree."""
+    if tag.startswith('service'):
+        for host_name, services in status[tag].iteritems():
+            for service_description, block in services.iteritems():
+                yield (host_name, service_description), block
+    else:
+        for name, block in status[tag].iteritems():
+            yield name, block
+
+def split_list(value):
+    """Split a comma separated object list, dropping empty names."""
+    if not value:
+        return []
+    return [name.strip() for name in str(value).split(',') if name.strip()]
+
+def build_object_indexes(object):
+    """Membership and reverse lookups for an object tree, built once per
+    objects.cache load instead of re-splitting member lists every time:
+      hostgroup_members      hostgroup -> [host]
+      host_hostgroups        host -> [hostgroup]
+      servicegroup_members   servicegroup -> [(host, service)]
+      host_servicegroups     host -> [servicegroup]
+      service_servicegroups  host -> service -> [servicegroup]
+      service_contacts       host -> service -> [contact]
+      service_contactgroups  host -> service -> [contactgroup]
+      command_services       command -> [(host, service)]"""
+    indexes = {'hostgroup_members': {}, 'host_hostgroups': {},
+            'servicegroup_members': {}, 'host_servicegroups': {},
+            'service_servicegroups': {}, 'service_contacts': {},
+            'service_contactgroups': {}, 'command_services': {}}
+    for hostgroup, block in object.get('hostgroup', {}).iteritems():
+        members = split_list(block.get('members'))
+        indexes['hostgroup_members'][hostgroup] = members
+        for host in members:
+            indexes['host_hostgroups'].setdefault(host, []).append(hostgroup)
+    for servicegroup, block in object.get('servicegroup', {}).iteritems():
+        names = split_list(block.get('members'))
+        members = zip(names[0::2], names[1::2])
+        indexes['servicegroup_members'][servicegroup] = members
+        for host, service in members:
+            groups = indexes['host_servicegroups'].setdefault(host, [])
+            if servicegroup not in groups:
+                groups.append(servicegroup)
+            indexes['service_servicegroups'].setdefault(host, {})\
+                    .setdefault(service, []).append(servicegroup)
+    for host, services in object.get('service', {}).iteritems():
+        for service, block in services.iteritems():
+            for field, index in (('contacts', 'service_contacts'),
+                    ('contact_groups', 'service_contactgroups')):
+                names = split_list(block.get(field))
+                if names:
+                    indexes[index].setdefault(host, {})[service] = names
+            command = block.get('check_command')
+            if command:
+                command = str(command).split('!')[0]
+                indexes['command_services'].setdefault(command, []).append((host, service))
+    return indexes
+
+def rss_kb():
+    """Resident set size of this process in kB, from /proc."""
+    for line in open('/proc/self/status'):
+        if line.startswith('VmRSS:'):
+            return int(line.split()[1])
+    return 0
+
+def memory_benchmark(file, loader=None):
+    """Load file with and without compact blocks, each in a forked child so
+    they don't share memory, and return {'dict': kB, 'compact': kB} of RSS
+    growth.  loader defaults to load_status, or load_object for
+    objects.cache."""
+    import marshal
+    if loader is None:
+        if file_sep(file) == '\t':
+            loader = load_object
+        else:
+            loader = load_status
+    result = {}
+    for mode, compact in (('dict', False), ('compact', True)):
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read)
+            before = rss_kb()
+            tree = loader(file, compact)
+            os.write(write, marshal.dumps(rss_kb() - before))
+            os._exit(0)
+        os.close(write)
+        data = ''
+        while True:
+            chunk = os.read(read, 4096)
+            if not chunk:
+                break
+            data += chunk
+        os.close(read)
+        os.waitpid(pid, 0)
+        result[mode] = marshal.loads(data)
+    return result
+
+def file_sep(file):
+    """The field separator of a status.dat ('=') or objects.cache ('\\t'),
+    going by its first block."""
+    for line in open(file, 'rb', READ_BUFFER):
+        line = line.strip()
+        if line.endswith('{') and not line.startswith('#'):
+            if line.startswith('define'):
+                return '\t'
+            break
+    return '='
+
+def verify_parallel(file, processes=None):
+    """Check that iter_blocks_parallel() gives exactly what iter_blocks()
+    does for file - the same blocks, in the same order - even when the file
+    is below PARALLEL_MIN_SIZE.  Returns (ok, blocks, chunks)."""
+    global PARALLEL_MIN_SIZE
+    sep = file_sep(file)
+    if processes is None:
+        processes = max(2, multiprocessing.cpu_count())
+    min_size = PARALLEL_MIN_SIZE
+    PARALLEL_MIN_SIZE = 0
+    try:
+        serial = list(iter_blocks(file, sep))
+        parallel = list(iter_blocks_parallel(file, sep, processes))
+    finally:
+        PARALLEL_MIN_SIZE = min_size
+    ranges = split_chunks(file, processes * CHUNKS_PER_PROCESS)
+    ok = serial == parallel and \
+            [block.keys() for tag, block in serial] == [block.keys() for tag, block in parallel]
+    return ok, len(serial), len(ranges)
+
+usage = """usage: %s memory <status.dat|objects.cache> ...
+       %s verify <status.dat|objects.cache> ... [processes]"""
+
+if __name__ == '__main__':
+    import sys
+    if len(sys.argv) < 3 or sys.argv[1] not in ('memory', 'verify'):
+        print usage % (sys.argv[0], sys.argv[0])
+        sys.exit(2)
+    if sys.argv[1] == 'verify':
+        files = sys.argv[2:]
+        processes = None
+        if files[-1].isdigit():
+            processes = int(files.pop())
+        failed = False
+        for file in files:
+            ok, blocks, chunks = verify_parallel(file, processes)
+            print "%s: %i blocks in %i chunks, %s" % (file, blocks, chunks,
+                    ok and 'same as serial' or 'DIFFERENT from serial')
+            failed = failed or not ok
+        sys.exit(failed and 1 or 0)
+    for file in sys.argv[2:]:
+        result = memory_benchmark(file)
+        if result['dict']:
+            saved = 100.0 - 100.0 * result['compact'] / result['dict']
+        else:
+            saved = 0.0
+        print "%s: dict blocks %i kB, compact blocks %i kB (%.1f%% smaller)" % \
+                (file, result['dict'], result['compact'], saved)
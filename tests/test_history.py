@@ -0,0 +1,37 @@
+"""ServiceHistory keeps perfdata values of any size and skips unkeyed services."""
+
+import os
+import sys
+import imp
+import unittest
+
+sys.dont_write_bytecode = True
+here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, here)
+nagiosstatd = imp.load_source('nagiosstatd', os.path.join(here, 'nagiosstatd'))
+
+class ServiceHistoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.history = nagiosstatd.ServiceHistory(4, 8)
+
+    def test_huge_value(self):
+        self.history.record(('web1', 'Disk'), 100, 0, 1e300)
+        self.history.record(('web1', 'Disk'), 200, 2, -1e300)
+        self.assertEqual(self.history.samples(('web1', 'Disk')),
+                [(100, 0, 1e300), (200, 2, -1e300)])
+
+    def test_missing_name(self):
+        self.history.record((None, 'Disk'), 100, 0, 1.0)
+        self.history.record(('web1', None), 100, 0, 1.0)
+        self.assertEqual(self.history.keys(), [])
+        self.assertEqual(len(self.history.free), 8)
+
+    def test_ring(self):
+        for x in range(6):
+            self.history.record(('web1', 'Load'), 100 + x, 0, x * 0.5)
+        self.assertEqual([value for checked, state, value in
+                self.history.samples(('web1', 'Load'))], [1.0, 1.5, 2.0, 2.5])
+
+if __name__ == '__main__':
+    unittest.main()
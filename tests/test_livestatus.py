@@ -0,0 +1,52 @@
+"""Livestatus filters: a bad regular expression is a 400, on any column."""
+
+import os
+import sys
+import imp
+import unittest
+
+sys.dont_write_bytecode = True
+here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, here)
+nagiosstatd = imp.load_source('nagiosstatd', os.path.join(here, 'nagiosstatd'))
+
+class LivestatusRegexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.argv = sys.argv[1:]
+        sys.argv[1:] = ['-o', os.devnull, '-s', os.devnull]
+        nagiosstatd.options = nagiosstatd.init()
+        self.snapshot = nagiosstatd.snapshot
+        object = {'host': {'web1': {'host_name': 'web1', 'alias': 'web1'}},
+                'hostgroup': {'web': {'hostgroup_name': 'web', 'members': 'web1'}}}
+        status = {'host': {'web1': {'host_name': 'web1', 'current_state': 0.0}}}
+        object_index = nagiosstatd.nagios_parse.build_object_indexes(object)
+        nagiosstatd.snapshot = nagiosstatd.Snapshot(1, object=object,
+                object_index=object_index, status=status)
+
+    def tearDown(self):
+        nagiosstatd.snapshot = self.snapshot
+        sys.argv[1:] = self.argv
+
+    def answer(self, filter):
+        return nagiosstatd.livestatus_answer(['GET hosts', 'Columns: name',
+                'Filter: %s' % (filter)])
+
+    def test_list_column(self):
+        code, body = self.answer('groups ~ [')
+        self.assertEqual(code, 400)
+        self.assertTrue(body.startswith('Invalid regular expression'))
+        self.assertEqual(self.answer('groups ~~ (')[0], 400)
+
+    def test_scalar_column(self):
+        code, body = self.answer('name ~ [')
+        self.assertEqual(code, 400)
+        self.assertTrue(body.startswith('Invalid regular expression'))
+        self.assertEqual(self.answer('name ~~ (')[0], 400)
+
+    def test_good_regex(self):
+        self.assertEqual(self.answer('groups ~ ^we'), (200, 'web1\n'))
+        self.assertEqual(self.answer('name ~~ ^WEB'), (200, 'web1\n'))
+
+if __name__ == '__main__':
+    unittest.main()
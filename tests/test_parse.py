@@ -0,0 +1,48 @@
+"""The parallel parse gives exactly the blocks the serial one does."""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.dont_write_bytecode = True
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import nagios_parse
+
+def service(host, number, output):
+    return ('servicestatus {\n\thost_name=%s\n\tservice_description=svc%i\n'
+            '\tcurrent_state=%i\n\tplugin_output=%s\n\tlast_check=%i\n\t}\n\n'
+            % (host, number, number % 4, output, 1000 + number))
+
+class ParallelParseTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.status = os.path.join(self.dir, 'status.dat')
+        handle = open(self.status, 'wb')
+        handle.write('info {\n\tcreated=1000\n\t}\n\n')
+        for number in range(2000):
+            output = 'OK - fine'
+            if number % 7 == 0:
+                # carriage returns and other splitlines() separators
+                output = 'CRITICAL - a\rb\x0bc\x1cd\x85e'
+            handle.write(service('host%i' % (number / 10), number, output))
+        handle.close()
+        self.min_size = nagios_parse.PARALLEL_MIN_SIZE
+        nagios_parse.PARALLEL_MIN_SIZE = 0
+
+    def tearDown(self):
+        nagios_parse.PARALLEL_MIN_SIZE = self.min_size
+        shutil.rmtree(self.dir, True)
+
+    def test_matches_serial(self):
+        serial = list(nagios_parse.iter_blocks(self.status))
+        parallel = list(nagios_parse.iter_blocks_parallel(self.status, processes=2))
+        self.assertEqual(len(serial), 2001)
+        self.assertEqual(parallel, serial)
+        outputs = [block['plugin_output'] for tag, block in serial if 'plugin_output' in block]
+        self.assertEqual(outputs[0], 'CRITICAL - a\rb\x0bc\x1cd\x85e')
+
+if __name__ == '__main__':
+    unittest.main()
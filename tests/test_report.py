@@ -0,0 +1,122 @@
+"""Hostgroup reports: the JSON keeps the int state keys nagiosstatc looks up,
+and only the durations and tickets are worked out per query."""
+
+import os
+import sys
+import imp
+import unittest
+import simplejson
+
+sys.dont_write_bytecode = True
+here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, here)
+nagiosstatd = imp.load_source('nagiosstatd', os.path.join(here, 'nagiosstatd'))
+
+def service(state, acked=0.0):
+    # parsed status blocks carry numbers as floats
+    return {'current_state': float(state), 'state_type': 1.0,
+            'last_hard_state_change': 1000.0, 'last_state_change': 1000.0,
+            'problem_has_been_acknowledged': acked,
+            'scheduled_downtime_depth': 0.0, 'plugin_output': 'output'}
+
+class Snap(object):
+    def __init__(self, status):
+        self.status = status
+        self.tickets = {}
+
+class ReportKeysTest(unittest.TestCase):
+
+    def setUp(self):
+        self.object_index = {'hostgroup_members': {'hg': ['h1']},
+                'host_hostgroups': {'h1': ['hg']}}
+        self.status = {'service': {'h1': {'ok': service(0), 'warn': service(1),
+                'crit': service(2), 'acked': service(2, 1.0)}}}
+
+    def render(self, report, status, name):
+        payload = simplejson.dumps(report.render(Snap(status), name, 'hg', 2000.0),
+                default=nagiosstatd.jsonable)
+        return simplejson.loads(payload)
+
+    def test_count_keys(self):
+        report = nagiosstatd.HostgroupReport.build(self.object_index, self.status)
+        result = self.render(report, self.status, 'hostgroup_svc_count')
+        self.assertEqual(sorted(result['current_state']), ['0', '1', '2', '3'])
+        self.assertEqual(sorted(result['unhandled']), ['1', '2', '3'])
+        self.assertEqual(sorted(result['duration']), ['1', '2', '3'])
+        self.assertEqual(result['current_state']['2'], 2)
+        self.assertEqual(result['unhandled']['2'], 1)
+
+    def test_svc_keys(self):
+        report = nagiosstatd.HostgroupReport.build(self.object_index, self.status)
+        result = self.render(report, self.status, 'hostgroup_svc')
+        self.assertEqual(sorted(result['current_state']), ['0', '1', '2', '3'])
+        result = self.render(report, self.status, 'hostgroup_svc_prob')
+        self.assertEqual(sorted(result['current_state']), ['1', '2', '3'])
+
+    def test_update_keeps_keys(self):
+        report = nagiosstatd.HostgroupReport.build(self.object_index, self.status)
+        status = {'service': {'h1': dict(self.status['service']['h1'])}}
+        status['service']['h1']['ok'] = service(3)
+        changes = {'service': {'added': [], 'removed': [],
+                'modified': [('h1', 'ok')]}}
+        report = report.update(self.object_index, self.status, status, changes)
+        result = self.render(report, status, 'hostgroup_svc_count')
+        self.assertEqual(sorted(result['current_state']), ['0', '1', '2', '3'])
+        self.assertEqual(result['current_state']['0'], 0)
+        self.assertEqual(result['current_state']['3'], 1)
+        self.assertEqual(result['unhandled']['3'], 1)
+
+class ReportCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.argv = sys.argv[1:]
+        sys.argv[1:] = ['-o', os.devnull, '-s', os.devnull, '--report_cache_age', '10']
+        nagiosstatd.options = nagiosstatd.init()
+        self.object_index = {'hostgroup_members': {'hg': ['h1']},
+                'host_hostgroups': {'h1': ['hg']}}
+        self.status = {'service': {'h1': {'crit': service(2), 'warn': service(1)}}}
+        self.report = nagiosstatd.HostgroupReport.build(self.object_index, self.status)
+
+    def tearDown(self):
+        sys.argv[1:] = self.argv
+
+    def test_durations_per_query(self):
+        snap = Snap(self.status)
+        first = self.report.render(snap, 'hostgroup_svc_count', 'hg', 2000.0)
+        second = self.report.render(snap, 'hostgroup_svc_count', 'hg', 2500.0)
+        self.assertEqual(first['duration'][2], [1000.0])
+        self.assertEqual(second['duration'][2], [1500.0])
+        self.assertEqual(second['current_state'], first['current_state'])
+        self.assertTrue(('hostgroup_svc_count', 'hg') in self.report.stable_parts)
+
+    def test_tickets_per_query(self):
+        snap = Snap(self.status)
+        entries = self.report.render(snap, 'hostgroup_svc', 'hg', 2000.0)['current_state'][2]
+        self.assertEqual(entries.values()[0]['ticket'], None)
+        snap.tickets = {'h1': {'crit': {'ticket': 'OPS-1', 'owner': 'jo',
+                'priority': 'P1'}}}
+        entries = self.report.render(snap, 'hostgroup_svc', 'hg', 2100.0)['current_state'][2]
+        entry = entries.values()[0]
+        self.assertEqual((entry['ticket'], entry['duration']), ('OPS-1', 1100.0))
+        warn = self.report.render(snap, 'hostgroup_svc', 'hg', 2100.0)['current_state'][1]
+        self.assertEqual(warn.values()[0]['ticket'], None)
+
+    def test_cache_key_ages(self):
+        self.assertTrue('report' not in nagiosstatd.uncached_verbs)
+        snap = nagiosstatd.Snapshot(3)
+        words = ['report', 'hostgroup_svc_count', 'hg']
+        clock = nagiosstatd.time.time
+        try:
+            nagiosstatd.time.time = lambda: 1001.0
+            first = nagiosstatd.cache_key(words, snap)
+            nagiosstatd.time.time = lambda: 1009.0
+            same = nagiosstatd.cache_key(words, snap)
+            nagiosstatd.time.time = lambda: 1011.0
+            later = nagiosstatd.cache_key(words, snap)
+        finally:
+            nagiosstatd.time.time = clock
+        self.assertEqual(first, same)
+        self.assertNotEqual(first, later)
+
+if __name__ == '__main__':
+    unittest.main()
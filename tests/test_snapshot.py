@@ -0,0 +1,61 @@
+"""Saved snapshots are only loaded while the files' mtimes and sizes agree."""
+
+import os
+import sys
+import imp
+import shutil
+import tempfile
+import unittest
+
+sys.dont_write_bytecode = True
+here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, here)
+nagiosstatd = imp.load_source('nagiosstatd', os.path.join(here, 'nagiosstatd'))
+
+class LoadSnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.object = os.path.join(self.dir, 'objects.cache')
+        self.status = os.path.join(self.dir, 'status.dat')
+        self.path = os.path.join(self.dir, 'snapshot')
+        self.write(self.object, 'define host {\n\thost_name\th1\n\t}\n', 1000)
+        self.write(self.status, 'hoststatus {\n\thost_name=h1\n\t}\n', 2000)
+        sys.argv[1:] = ['-o', self.object, '-s', self.status]
+        nagiosstatd.options = nagiosstatd.init()
+        signatures = {'object': nagiosstatd.file_signature(self.object),
+                'status': nagiosstatd.file_signature(self.status)}
+        snap = nagiosstatd.Snapshot(5, status={'host': {'h1': {}}})
+        nagiosstatd.save_snapshot(snap, self.path, signatures)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, True)
+
+    def write(self, path, data, mtime):
+        open(path, 'w').write(data)
+        os.utime(path, (mtime, mtime))
+
+    def test_unchanged(self):
+        saved = nagiosstatd.load_snapshot(self.path)
+        self.assertEqual(saved['generation'], 5)
+        self.assertEqual(saved['status'], {'host': {'h1': {}}})
+
+    def test_newer_file(self):
+        # parsed again by the refresher, the snapshot is served meanwhile
+        self.write(self.status, 'hoststatus {\n\thost_name=h2\n\t}\n', 3000)
+        self.assertNotEqual(nagiosstatd.load_snapshot(self.path), None)
+
+    def test_older_file(self):
+        self.write(self.status, 'hoststatus {\n\thost_name=h1\n\t}\n', 1500)
+        self.assertEqual(nagiosstatd.load_snapshot(self.path), None)
+
+    def test_size_changed(self):
+        self.write(self.object, 'define host {\n\thost_name\th10\n\t}\n', 1000)
+        self.assertEqual(nagiosstatd.load_snapshot(self.path), None)
+
+    def test_missing_file(self):
+        os.unlink(self.status)
+        self.assertEqual(nagiosstatd.load_snapshot(self.path), None)
+
+if __name__ == '__main__':
+    unittest.main()
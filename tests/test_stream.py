@@ -0,0 +1,57 @@
+"""Streamed answers are byte for byte what simplejson.dumps() gives."""
+
+import os
+import sys
+import imp
+import unittest
+import simplejson
+
+sys.dont_write_bytecode = True
+here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, here)
+nagiosstatd = imp.load_source('nagiosstatd', os.path.join(here, 'nagiosstatd'))
+import nagios_parse
+
+def block(number):
+    return {'current_state': float(number % 4), 'plugin_output': 'OK - %i "q"' % (number),
+            'last_check': 1000.0 + number}
+
+class StreamTest(unittest.TestCase):
+
+    def check(self, value):
+        expected = simplejson.dumps(value, default=nagiosstatd.jsonable)
+        self.assertEqual(''.join(nagiosstatd.json_chunks(value)), expected)
+        return expected
+
+    def test_shapes(self):
+        status = dict([('host%i' % (host), dict([('svc%i' % (svc), block(svc))
+                for svc in range(5)])) for host in range(100)])
+        self.check({'query_ok': True, 'status': status})
+        self.check({'query_ok': True, 'rows': [block(x) for x in range(500)]})
+        self.check({2.0: set([('h%i' % (x), 's') for x in range(300)]), 1.0: set()})
+        self.check(range(1000))
+        self.check([[x, (x, 'a')] for x in range(10)])
+        self.check({'a': [], 'b': {}, 'c': [{}], 3: None, 2.5: 'x'})
+        self.check(nagios_parse.compact_block(block(1)))
+        self.check([nagios_parse.compact_block(block(x)) for x in range(100)])
+
+    def test_big_list_is_split(self):
+        rows = [block(x) for x in range(2000)]
+        pieces = list(nagiosstatd.json_pieces({'query_ok': True, 'rows': rows}))
+        self.assertTrue(len(pieces) > 2000)
+        self.assertTrue(max([len(piece) for piece in pieces]) < 200)
+
+    def test_spooled_length(self):
+        value = {'rows': [block(x) for x in range(3000)]}
+        expected = simplejson.dumps(value)
+        answer = nagiosstatd.StreamedAnswer(value, 1024)
+        self.assertEqual(answer.package, None)
+        self.assertEqual(answer.length(), len(expected))
+        self.assertEqual(''.join(answer), expected)
+
+    def test_small_answer(self):
+        answer = nagiosstatd.StreamedAnswer({'query_ok': True}, 1024)
+        self.assertEqual(answer.package, '{"query_ok": true}')
+
+if __name__ == '__main__':
+    unittest.main()
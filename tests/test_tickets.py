@@ -0,0 +1,97 @@
+"""Ticket lookups against the stand-in jira client in tests/jira."""
+
+import os
+import sys
+import imp
+import shutil
+import tempfile
+import unittest
+
+sys.dont_write_bytecode = True
+here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, here)
+nagiosstatd = imp.load_source('nagiosstatd', os.path.join(here, 'nagiosstatd'))
+
+issues = ['NAG-1,alice,Major,web1/HTTP is CRITICAL',
+        'NAG-2,bob,Minor,xweb1/HTTP is CRITICAL',
+        'NAG-3,,Critical,PROD: db1/Disk Space is CRITICAL',
+        'NAG-4,carol,Major,db1 is DOWN']
+
+class TicketLookupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.argv = sys.argv[1:]
+        sys.argv[1:] = ['-o', os.devnull, '-s', os.devnull]
+        nagiosstatd.options = nagiosstatd.init()
+        self.dir = tempfile.mkdtemp()
+        open(os.path.join(self.dir, 'issues'), 'w').write('\n'.join(issues) + '\n')
+        self.log = os.path.join(self.dir, 'log')
+        os.environ['JIRA_ISSUES'] = os.path.join(self.dir, 'issues')
+        os.environ['JIRA_LOG'] = self.log
+        # run the stand-in with this interpreter, whatever /usr/bin/python is
+        self.jira = os.path.join(self.dir, 'jira')
+        open(self.jira, 'w').write('#!/bin/sh\nexec "%s" "%s" "$@"\n' % (sys.executable,
+                os.path.join(here, 'tests', 'jira')))
+        os.chmod(self.jira, 0755)
+        self.pool = nagiosstatd.TicketPool(self.jira, threads=0)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, True)
+        sys.argv[1:] = self.argv
+
+    def test_batch(self):
+        found = self.pool.lookup([('web1', 'HTTP'), ('xweb1', 'HTTP'),
+                ('db1', 'Disk Space'), ('db1', None), ('web2', 'HTTP')])
+        self.assertEqual(found, {('web1', 'HTTP'): ('NAG-1', 'alice', 'Major'),
+                ('xweb1', 'HTTP'): ('NAG-2', 'bob', 'Minor'),
+                ('db1', 'Disk Space'): ('NAG-3', None, 'Critical'),
+                ('db1', None): ('NAG-4', 'carol', 'Major')})
+        # one getissues for the whole batch, no cat per ticket
+        self.assertEqual(open(self.log).read().split(), ['getissues'])
+
+    def test_host_boundary(self):
+        # xweb1's ticket comes back from the query, but isn't web1's
+        found = self.pool.lookup([('web1', 'HTTP')])
+        self.assertEqual(found[('web1', 'HTTP')][0], 'NAG-1')
+        self.assertEqual(self.pool.lookup([('eb1', 'HTTP')]), {})
+
+    def test_quotes_and_shell(self):
+        # a quote mustn't break the batch, and nothing in a name is run
+        marker = os.path.join(self.dir, 'ran')
+        # spaces become '%' in the query, so the command has none
+        service = 'It\'s "up" $(touch${IFS}%s)' % (marker)
+        open(os.environ['JIRA_ISSUES'], 'a').write('NAG-5,dave,Major,web1/%s is CRITICAL\n'
+                % (service))
+        found = self.pool.lookup([('web1', 'HTTP'), ('web1', service)])
+        self.assertEqual(found, {('web1', 'HTTP'): ('NAG-1', 'alice', 'Major'),
+                ('web1', service): ('NAG-5', 'dave', 'Major')})
+        self.assertFalse(os.path.exists(marker))
+
+    def test_jql_string(self):
+        self.assertEqual(nagiosstatd.jql_string('a\'b"c\\d'), '\'a\\\'b\\"c\\\\d\'')
+
+class PublishTicketsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.argv = sys.argv[1:]
+        sys.argv[1:] = ['-o', os.devnull, '-s', os.devnull]
+        nagiosstatd.options = nagiosstatd.init()
+        self.saved = nagiosstatd.tickets, nagiosstatd.snapshot
+
+    def tearDown(self):
+        nagiosstatd.tickets, nagiosstatd.snapshot = self.saved
+        sys.argv[1:] = self.argv
+
+    def test_same_generation(self):
+        nagiosstatd.tickets = nagiosstatd.TicketCache('', 100)
+        nagiosstatd.snapshot = nagiosstatd.Snapshot(7, status={'host': {}})
+        nagiosstatd.tickets.put('web1', 'HTTP', 'NAG-1', 'alice', 'Major')
+        log = len(nagiosstatd.change_log)
+        snap = nagiosstatd.publish_tickets()
+        self.assertEqual(snap.generation, 7)
+        self.assertEqual(snap.status, {'host': {}})
+        self.assertEqual(snap.tickets['web1']['HTTP']['ticket'], 'NAG-1')
+        self.assertEqual(len(nagiosstatd.change_log), log)
+
+if __name__ == '__main__':
+    unittest.main()
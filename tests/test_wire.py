@@ -0,0 +1,47 @@
+"""Replicate frames are marshalled plain values, compact records included."""
+
+import os
+import sys
+import imp
+import cPickle
+import marshal
+import unittest
+
+sys.dont_write_bytecode = True
+here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, here)
+nagiosstatd = imp.load_source('nagiosstatd', os.path.join(here, 'nagiosstatd'))
+nagios_parse = nagiosstatd.nagios_parse
+
+class WireTest(unittest.TestCase):
+
+    def setUp(self):
+        sys.argv[1:] = ['-o', os.devnull, '-s', os.devnull, '--compact']
+        nagiosstatd.options = nagiosstatd.init()
+
+    def test_compact_round_trip(self):
+        block = nagios_parse.compact_block({'host_name': 'web1',
+                'service_description': 'HTTP', 'current_state': 2.0})
+        frame = {'kind': 'delta', 'generation': 7, 'time': 1.5,
+                'changes': {'service': {'added': [('web1', 'HTTP')],
+                        'removed': [], 'modified': []}},
+                'blocks': {'service': {('web1', 'HTTP'): block}},
+                'unkeyed': {'info': {'version': '3.5'}}}
+        decoded = nagiosstatd.wire_loads(nagiosstatd.wire_dumps(frame))
+        record = decoded['blocks']['service'][('web1', 'HTTP')]
+        self.assertTrue(record.__class__ is nagios_parse.Record)
+        self.assertEqual(record, block)
+        self.assertTrue(record._schema is block._schema)
+        self.assertEqual(decoded['changes'], frame['changes'])
+        self.assertEqual(decoded['unkeyed'], frame['unkeyed'])
+        self.assertEqual(decoded['generation'], 7)
+
+    def test_pickle_refused(self):
+        payload = cPickle.dumps({'kind': 'heartbeat'}, cPickle.HIGHEST_PROTOCOL)
+        self.assertRaises(ValueError, nagiosstatd.wire_loads, payload)
+
+    def test_not_a_frame(self):
+        self.assertRaises(ValueError, nagiosstatd.wire_loads, marshal.dumps([1, 2]))
+
+if __name__ == '__main__':
+    unittest.main()